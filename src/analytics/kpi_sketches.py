@@ -0,0 +1,401 @@
+"""
+kpi_sketches.py
+
+Mergeable Streaming Sketches for Real-Time Logistics and Demand KPIs
+t-digest quantiles, HyperLogLog distinct counts and count-min heavy hitters,
+each updatable per event, mergeable across shards and persistable as JSON
+"""
+
+import base64
+import hashlib
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def _hash64(value):
+    """Stable 64-bit hash (Python's hash() is salted per process)"""
+    digest = hashlib.blake2b(str(value).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def _encode_array(array):
+    return base64.b64encode(np.ascontiguousarray(array).tobytes()).decode('ascii')
+
+
+def _decode_array(text, dtype):
+    return np.frombuffer(base64.b64decode(text), dtype=dtype).copy()
+
+
+class TDigest:
+    """Merging t-digest for streaming quantiles in bounded memory"""
+
+    def __init__(self, compression=200):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.count = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._buffer = []
+
+    def _k(self, q):
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _k_inverse(self, k):
+        return (math.sin(k * 2 * math.pi / self.compression) + 1) / 2
+
+    def add(self, value, weight=1.0):
+        if value is None or not math.isfinite(value):
+            return
+        self._buffer.append((float(value), float(weight)))
+        self.count += weight
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self._buffer) >= 5 * self.compression:
+            self._compress()
+
+    def add_many(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return
+        self._buffer.extend(zip(values.tolist(), [1.0] * len(values)))
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._compress()
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        buffered = np.array(self._buffer)
+        self._buffer = []
+        means = np.concatenate([self.means, buffered[:, 0]])
+        weights = np.concatenate([self.weights, buffered[:, 1]])
+        order = np.argsort(means, kind='mergesort')
+        means, weights = means[order], weights[order]
+
+        merged_means, merged_weights = [], []
+        current_mean, current_weight = means[0], weights[0]
+        weight_so_far = 0.0
+        q_limit = self._k_inverse(self._k(0.0) + 1)
+        for mean, weight in zip(means[1:], weights[1:]):
+            if (weight_so_far + current_weight + weight) / self.count <= q_limit:
+                current_weight += weight
+                current_mean += (mean - current_mean) * weight / current_weight
+            else:
+                merged_means.append(current_mean)
+                merged_weights.append(current_weight)
+                weight_so_far += current_weight
+                q_limit = self._k_inverse(self._k(weight_so_far / self.count) + 1)
+                current_mean, current_weight = mean, weight
+        merged_means.append(current_mean)
+        merged_weights.append(current_weight)
+        self.means = np.array(merged_means)
+        self.weights = np.array(merged_weights)
+
+    def quantile(self, q):
+        self._compress()
+        if not len(self.means):
+            return None
+        if len(self.means) == 1:
+            return float(self.means[0])
+
+        target = q * self.count
+        centers = np.cumsum(self.weights) - self.weights / 2
+        if target <= centers[0]:
+            return float(self.min + (self.means[0] - self.min) * target / centers[0])
+        if target >= centers[-1]:
+            tail = self.count - centers[-1]
+            return float(self.means[-1] + (self.max - self.means[-1]) * (target - centers[-1]) / tail)
+        i = int(np.searchsorted(centers, target, side='right')) - 1
+        fraction = (target - centers[i]) / (centers[i + 1] - centers[i])
+        return float(self.means[i] + fraction * (self.means[i + 1] - self.means[i]))
+
+    def merge(self, other):
+        other._compress()
+        self._buffer.extend(zip(other.means.tolist(), other.weights.tolist()))
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def to_dict(self):
+        self._compress()
+        return {
+            'compression': self.compression,
+            'means': self.means.tolist(),
+            'weights': self.weights.tolist(),
+            'count': self.count,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        digest = cls(state['compression'])
+        digest.means = np.array(state['means'], dtype=float)
+        digest.weights = np.array(state['weights'], dtype=float)
+        digest.count = state['count']
+        if state['count']:
+            digest.min, digest.max = state['min'], state['max']
+        return digest
+
+
+class HyperLogLog:
+    """Distinct-count estimator with 2**precision one-byte registers"""
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, value):
+        hashed = _hash64(value)
+        index = hashed >> (64 - self.precision)
+        remainder = (hashed << self.precision) & ((1 << 64) - 1)
+        rank = 65 - remainder.bit_length() if remainder else 65 - self.precision
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def add_many(self, values):
+        for value in values:
+            self.add(value)
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(float)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches with different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def to_dict(self):
+        return {'precision': self.precision, 'registers': _encode_array(self.registers)}
+
+    @classmethod
+    def from_dict(cls, state):
+        sketch = cls(state['precision'])
+        sketch.registers = _decode_array(state['registers'], np.uint8)
+        return sketch
+
+
+class CountMinSketch:
+    """Count-min frequency sketch that also tracks the current heavy hitters"""
+
+    def __init__(self, width=2048, depth=4, top_k=10):
+        if not 1 <= depth <= 8:
+            raise ValueError("depth must be between 1 and 8")
+        self.width = width
+        self.depth = depth
+        self.top_k = top_k
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.heavy_hitters = {}
+
+    def _columns(self, key):
+        digest = hashlib.blake2b(str(key).encode(), digest_size=8 * self.depth).digest()
+        return [
+            int.from_bytes(digest[8 * row:8 * (row + 1)], 'big') % self.width
+            for row in range(self.depth)
+        ]
+
+    def estimate(self, key):
+        columns = self._columns(key)
+        return int(min(self.table[row, column] for row, column in enumerate(columns)))
+
+    def add(self, key, count=1):
+        for row, column in enumerate(self._columns(key)):
+            self.table[row, column] += count
+        self._track(key, self.estimate(key))
+
+    def _track(self, key, estimate):
+        # Candidate list is a few times top_k so late risers are not lost
+        capacity = 4 * self.top_k
+        if key in self.heavy_hitters or len(self.heavy_hitters) < capacity:
+            self.heavy_hitters[key] = estimate
+            return
+        weakest = min(self.heavy_hitters, key=self.heavy_hitters.get)
+        if estimate > self.heavy_hitters[weakest]:
+            del self.heavy_hitters[weakest]
+            self.heavy_hitters[key] = estimate
+
+    def top(self, n=None):
+        ranked = sorted(self.heavy_hitters.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:n or self.top_k]
+
+    def merge(self, other):
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Cannot merge count-min sketches with different dimensions")
+        self.table += other.table
+        candidates = set(self.heavy_hitters) | set(other.heavy_hitters)
+        self.heavy_hitters = {}
+        for key in candidates:
+            self._track(key, self.estimate(key))
+        return self
+
+    def to_dict(self):
+        return {
+            'width': self.width,
+            'depth': self.depth,
+            'top_k': self.top_k,
+            'table': _encode_array(self.table),
+            'heavy_hitters': self.heavy_hitters,
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        sketch = cls(state['width'], state['depth'], state['top_k'])
+        sketch.table = _decode_array(state['table'], np.int64).reshape(sketch.depth, sketch.width)
+        sketch.heavy_hitters = dict(state['heavy_hitters'])
+        return sketch
+
+
+class SupplyChainKPISketches:
+    """Constant-memory KPI state for shipment and demand event streams.
+
+    Each shard updates its own instance per event; instances merge into a
+    global view and round-trip through save/load between runs. Watermarks
+    record the newest shipment and demand date folded in, so a reloaded
+    instance skips shipments it has seen and demand from earlier days. The
+    latest day stays open because a day's demand may arrive in batches;
+    re-adding a SKU to the distinct count is harmless.
+    """
+
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self):
+        self.delivery_time = TDigest()
+        self.cost_per_unit = TDigest()
+        self.active_skus = HyperLogLog()
+        self.active_suppliers = HyperLogLog()
+        self.lanes = CountMinSketch()
+        self.watermarks = {'shipment_id': None, 'demand_date': None}
+
+    @staticmethod
+    def lane(event):
+        """Route-level lane key: supplier and transportation mode"""
+        return f"{event['supplier_id']} -> {event['transportation_mode']}"
+
+    def update_shipment(self, event):
+        """Fold one logistics record (a row of logistics.csv) into the sketches"""
+        seen = self.watermarks['shipment_id']
+        if seen is not None and event['shipment_id'] <= seen:
+            return
+        self.watermarks['shipment_id'] = event['shipment_id']
+        self.delivery_time.add(event['delivery_time_days'])
+        if event.get('cost_per_unit') is not None:
+            self.cost_per_unit.add(event['cost_per_unit'])
+        elif event['quantity']:
+            self.cost_per_unit.add(event['shipping_cost'] / event['quantity'])
+        self.active_skus.add(event['product_id'])
+        self.active_suppliers.add(event['supplier_id'])
+        self.lanes.add(self.lane(event))
+
+    def update_demand(self, event):
+        """Fold one demand record into the sketches"""
+        date = pd.Timestamp(event['date'])
+        seen = self.watermarks['demand_date']
+        if seen is not None and date < pd.Timestamp(seen):
+            return
+        self.watermarks['demand_date'] = date.strftime('%Y-%m-%d')
+        if event['demand_quantity'] > 0:
+            self.active_skus.add(event['product_id'])
+
+    def update_logistics_frame(self, logistics_df):
+        """Bulk update from a logistics frame, skipping shipments already folded in"""
+        seen = self.watermarks['shipment_id']
+        if seen is not None:
+            logistics_df = logistics_df[logistics_df['shipment_id'] > seen]
+        if logistics_df.empty:
+            return
+        self.watermarks['shipment_id'] = logistics_df['shipment_id'].max()
+        self.delivery_time.add_many(logistics_df['delivery_time_days'])
+        shipped = logistics_df[logistics_df['quantity'] > 0]
+        self.cost_per_unit.add_many(shipped['shipping_cost'] / shipped['quantity'])
+        self.active_skus.add_many(logistics_df['product_id'].unique())
+        self.active_suppliers.add_many(logistics_df['supplier_id'].unique())
+        for event in logistics_df[['supplier_id', 'transportation_mode']].to_dict('records'):
+            self.lanes.add(self.lane(event))
+
+    def update_demand_frame(self, demand_df):
+        """Bulk update from a demand frame, skipping dates already folded in"""
+        dates = pd.to_datetime(demand_df['date'])
+        seen = self.watermarks['demand_date']
+        if seen is not None:
+            new = dates >= pd.Timestamp(seen)
+            demand_df, dates = demand_df[new], dates[new]
+        if demand_df.empty:
+            return
+        self.watermarks['demand_date'] = dates.max().strftime('%Y-%m-%d')
+        self.active_skus.add_many(demand_df.loc[demand_df['demand_quantity'] > 0, 'product_id'].unique())
+
+    def merge(self, other):
+        self.delivery_time.merge(other.delivery_time)
+        self.cost_per_unit.merge(other.cost_per_unit)
+        self.active_skus.merge(other.active_skus)
+        self.active_suppliers.merge(other.active_suppliers)
+        self.lanes.merge(other.lanes)
+        # Shipment ids are zero-padded and dates ISO formatted, so both sort as strings
+        for name, theirs in other.watermarks.items():
+            ours = self.watermarks[name]
+            if theirs is not None and (ours is None or theirs > ours):
+                self.watermarks[name] = theirs
+        return self
+
+    def kpis(self):
+        """Current percentile, distinct-count and heavy-hitter KPIs"""
+        kpis = {}
+        for name, digest in (('delivery_time_days', self.delivery_time),
+                             ('cost_per_unit', self.cost_per_unit)):
+            for q in self.QUANTILES:
+                kpis[f"{name}_p{int(q * 100)}"] = digest.quantile(q)
+        kpis['distinct_active_skus'] = self.active_skus.count()
+        kpis['distinct_active_suppliers'] = self.active_suppliers.count()
+        kpis['top_lanes'] = self.lanes.top()
+        return kpis
+
+    def to_dict(self):
+        return {
+            'delivery_time': self.delivery_time.to_dict(),
+            'cost_per_unit': self.cost_per_unit.to_dict(),
+            'active_skus': self.active_skus.to_dict(),
+            'active_suppliers': self.active_suppliers.to_dict(),
+            'lanes': self.lanes.to_dict(),
+            'watermarks': self.watermarks,
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        sketches = cls()
+        sketches.delivery_time = TDigest.from_dict(state['delivery_time'])
+        sketches.cost_per_unit = TDigest.from_dict(state['cost_per_unit'])
+        sketches.active_skus = HyperLogLog.from_dict(state['active_skus'])
+        sketches.active_suppliers = HyperLogLog.from_dict(state['active_suppliers'])
+        sketches.lanes = CountMinSketch.from_dict(state['lanes'])
+        sketches.watermarks.update(state.get('watermarks', {}))
+        return sketches
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load persisted sketches, or start empty if none were saved yet"""
+        if not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
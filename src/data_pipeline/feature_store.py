@@ -0,0 +1,277 @@
+"""
+feature_store.py
+
+Memory-Mapped Demand Feature Store shared by forecasting, inventory and risk models
+"""
+
+import json
+import logging
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+MANIFEST_FILE = "manifest.json"
+DTYPE = "float32"
+
+LAGS = (1, 7, 28)
+ROLLING_WINDOWS = (7, 28)
+
+# Days of history needed to extend lags and rolling windows without recomputing
+HISTORY_DAYS = max(max(LAGS), max(ROLLING_WINDOWS))
+
+SKU_FEATURES = (
+    ['demand']
+    + [f'lag_{lag}' for lag in LAGS]
+    + [f'rolling_mean_{window}' for window in ROLLING_WINDOWS]
+    + [f'rolling_var_{window}' for window in ROLLING_WINDOWS]
+)
+CALENDAR_FEATURES = (
+    'year', 'month', 'quarter', 'day_of_week',
+    'yearly_sin', 'yearly_cos', 'weekly_sin', 'weekly_cos'
+)
+
+
+def _daily_demand_matrix(demand_df, skus, dates):
+    """Pivot raw demand rows into a dense (date x SKU) matrix"""
+    frame = demand_df[['date', 'product_id', 'demand_quantity']].copy()
+    frame['date'] = pd.to_datetime(frame['date'])
+    wide = frame.pivot_table(
+        index='date', columns='product_id', values='demand_quantity', aggfunc='sum'
+    )
+    wide = wide.reindex(index=dates, columns=skus).fillna(0)
+    return wide.to_numpy(dtype=DTYPE)
+
+
+def _sku_features(demand, n_history):
+    """Compute per-SKU features for the rows after the first n_history rows"""
+    rolling_source = pd.DataFrame(demand)
+    features = {'demand': demand}
+    for lag in LAGS:
+        lagged = np.full_like(demand, np.nan)
+        lagged[lag:] = demand[:-lag]
+        features[f'lag_{lag}'] = lagged
+    for window in ROLLING_WINDOWS:
+        rolling = rolling_source.rolling(window, min_periods=1)
+        features[f'rolling_mean_{window}'] = rolling.mean().to_numpy(dtype=DTYPE)
+        features[f'rolling_var_{window}'] = rolling.var().to_numpy(dtype=DTYPE)
+    return {name: values[n_history:] for name, values in features.items()}
+
+
+def _calendar_features(dates):
+    """Calendar and seasonal indicators matching transform_data"""
+    dates = pd.DatetimeIndex(dates)
+    yearly = 2 * np.pi * dates.dayofyear.to_numpy() / 365
+    weekly = 2 * np.pi * dates.dayofweek.to_numpy() / 7
+    return {
+        'year': dates.year.to_numpy(),
+        'month': dates.month.to_numpy(),
+        'quarter': dates.quarter.to_numpy(),
+        'day_of_week': dates.dayofweek.to_numpy(),
+        'yearly_sin': np.sin(yearly),
+        'yearly_cos': np.cos(yearly),
+        'weekly_sin': np.sin(weekly),
+        'weekly_cos': np.cos(weekly),
+    }
+
+
+class FeatureStore:
+    """Columnar demand features stored as raw memory-mapped arrays on local disk.
+
+    Each per-SKU feature is a row-major (date x SKU) float32 file and each
+    calendar feature a (date,) file, all inside a versioned directory named
+    by the manifest. Appends first trim any bytes a crashed writer left past
+    the manifest's day count and then extend the files; rebuilds write a new
+    version. The manifest is replaced atomically last in both cases, so
+    readers mapping the store read-only only ever see fully written days.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.manifest = None
+        self._sku_index = {}
+        self._maps = {}
+        self.refresh()
+
+    def __getstate__(self):
+        # Worker processes re-map the files instead of receiving copies
+        state = self.__dict__.copy()
+        state['_maps'] = {}
+        return state
+
+    @property
+    def exists(self):
+        return self.manifest is not None
+
+    @property
+    def skus(self):
+        return list(self.manifest['skus']) if self.exists else []
+
+    @property
+    def n_days(self):
+        return self.manifest['n_days'] if self.exists else 0
+
+    @property
+    def dates(self):
+        if not self.exists:
+            return pd.DatetimeIndex([])
+        return pd.date_range(self.manifest['start_date'], periods=self.n_days, freq='D')
+
+    def refresh(self):
+        """Reload the manifest to pick up days appended by another process"""
+        path = os.path.join(self.root, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            self.manifest = json.load(f)
+        self._sku_index = {sku: i for i, sku in enumerate(self.manifest['skus'])}
+        self._maps = {}
+
+    def _path(self, name, version=None):
+        version = version or self.manifest['version']
+        return os.path.join(self.root, version, f"{name}.{DTYPE}")
+
+    def _row_bytes(self, name):
+        width = len(self.manifest['skus']) if name in self.manifest['sku_features'] else 1
+        return width * np.dtype(self.manifest['dtype']).itemsize
+
+    def _write_manifest(self, manifest):
+        tmp_path = os.path.join(self.root, f"{MANIFEST_FILE}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, os.path.join(self.root, MANIFEST_FILE))
+
+    def _append(self, features, version=None):
+        for name, values in features.items():
+            with open(self._path(name, version), 'ab') as f:
+                f.write(np.ascontiguousarray(values, dtype=DTYPE).tobytes())
+
+    def _truncate_to_manifest(self):
+        """Drop bytes past the committed days, left behind by an interrupted append"""
+        for name in self.manifest['sku_features'] + self.manifest['calendar_features']:
+            committed = self.n_days * self._row_bytes(name)
+            if os.path.getsize(self._path(name)) != committed:
+                os.truncate(self._path(name), committed)
+
+    def _remove_stale_versions(self, keep):
+        # The previous version stays for readers still holding the old manifest
+        for entry in os.listdir(self.root):
+            path = os.path.join(self.root, entry)
+            if os.path.isdir(path) and entry.startswith('v') and entry not in keep:
+                shutil.rmtree(path, ignore_errors=True)
+            elif entry.endswith(f".{DTYPE}"):
+                os.remove(path)
+
+    def _history_changed(self, demand_df, dates):
+        """True when rows for days already stored no longer match the store"""
+        if dates.min() < self.dates[0]:
+            return True
+        overlap = self.dates[self.dates >= dates.min()]
+        if not len(overlap):
+            return False
+        incoming = _daily_demand_matrix(demand_df[dates <= overlap[-1]], self.skus, overlap)
+        stored = self.feature('demand')[self.date_index(overlap[0]):]
+        return not np.array_equal(incoming, stored)
+
+    def build(self, demand_df):
+        """Compute every feature from scratch and replace the store"""
+        dates = pd.to_datetime(demand_df['date'])
+        skus = sorted(demand_df['product_id'].unique())
+        all_dates = pd.date_range(dates.min(), dates.max(), freq='D')
+
+        demand = _daily_demand_matrix(demand_df, skus, all_dates)
+        # Stores written before versioning have no version and keep files in the root
+        previous = self.manifest.get('version') if self.exists else None
+        version = f"v{int(previous[1:]) + 1 if previous else 1:04d}"
+        shutil.rmtree(os.path.join(self.root, version), ignore_errors=True)
+        os.makedirs(os.path.join(self.root, version))
+        self._append(_sku_features(demand, 0), version)
+        self._append(_calendar_features(all_dates), version)
+        self._write_manifest({
+            'version': version,
+            'skus': skus,
+            'start_date': all_dates[0].strftime('%Y-%m-%d'),
+            'n_days': len(all_dates),
+            'dtype': DTYPE,
+            'sku_features': list(SKU_FEATURES),
+            'calendar_features': list(CALENDAR_FEATURES),
+        })
+        self.refresh()
+        self._remove_stale_versions(keep={version, previous})
+        logging.info(f"Built feature store: {len(all_dates)} days x {len(skus)} SKUs")
+        return len(all_dates)
+
+    def update(self, demand_df):
+        """Append days newer than the store, rebuilding when SKUs, layout or history changed.
+
+        Returns the number of days written.
+        """
+        if not self.exists or 'version' not in self.manifest \
+                or set(demand_df['product_id'].unique()) - set(self.skus) \
+                or self.manifest.get('sku_features') != list(SKU_FEATURES):
+            return self.build(demand_df)
+
+        dates = pd.to_datetime(demand_df['date'])
+        if self._history_changed(demand_df, dates):
+            logging.info("Stored demand history was restated; rebuilding feature store")
+            return self.build(demand_df)
+
+        last_date = self.dates[-1]
+        new_rows = demand_df[dates > last_date]
+        if new_rows.empty:
+            return 0
+
+        new_dates = pd.date_range(last_date + pd.Timedelta(days=1), dates.max(), freq='D')
+        n_history = min(HISTORY_DAYS, self.n_days)
+        history = np.asarray(self.feature('demand')[self.n_days - n_history:])
+        demand = np.vstack([history, _daily_demand_matrix(new_rows, self.skus, new_dates)])
+
+        # Drop mappings before growing the files underneath them
+        self._maps = {}
+        self._truncate_to_manifest()
+        self._append(_sku_features(demand, n_history))
+        self._append(_calendar_features(new_dates))
+        manifest = dict(self.manifest, n_days=self.n_days + len(new_dates))
+        self._write_manifest(manifest)
+        self.refresh()
+        logging.info(f"Appended {len(new_dates)} days to feature store")
+        return len(new_dates)
+
+    def feature(self, name):
+        """Read-only memory map of one feature, shared through the OS page cache"""
+        if not self.exists:
+            raise FileNotFoundError(f"No feature store at {self.root}")
+        if name not in self._maps:
+            if name in self.manifest['sku_features']:
+                shape = (self.n_days, len(self.manifest['skus']))
+            elif name in self.manifest['calendar_features']:
+                shape = (self.n_days,)
+            else:
+                raise KeyError(f"Unknown feature: {name}")
+            self._maps[name] = np.memmap(
+                self._path(name), dtype=self.manifest['dtype'], mode='r', shape=shape
+            )
+        return self._maps[name]
+
+    def sku_index(self, sku):
+        return self._sku_index[sku]
+
+    def date_index(self, date):
+        offset = (pd.Timestamp(date) - pd.Timestamp(self.manifest['start_date'])).days
+        if not 0 <= offset < self.n_days:
+            raise KeyError(f"Date outside feature store: {date}")
+        return offset
+
+    def get(self, sku, start=None, end=None, features=None):
+        """Feature frame for one SKU between start and end dates (inclusive)"""
+        column = self.sku_index(sku)
+        first = self.date_index(start) if start is not None else 0
+        last = self.date_index(end) + 1 if end is not None else self.n_days
+        names = features or self.manifest['sku_features'] + self.manifest['calendar_features']
+
+        frame = {}
+        for name in names:
+            values = self.feature(name)
+            frame[name] = values[first:last, column] if values.ndim == 2 else values[first:last]
+        return pd.DataFrame(frame, index=self.dates[first:last])
@@ -0,0 +1,358 @@
+"""
+snapshot_store.py
+
+Delta-Encoded Storage for Periodic Inventory Snapshots
+Keeps a base snapshot plus per-period deltas of changed fields
+"""
+
+import bisect
+import json
+import logging
+import os
+import zlib
+
+import numpy as np
+import pandas as pd
+
+MANIFEST_FILE = "manifest.json"
+CHANGED_COLUMN = "_changed"
+
+# Bitmask value marking a key that disappeared from the snapshot
+REMOVED = -1
+
+
+def _partition_of(key, partitions):
+    """Stable partition for a SKU so range scans only decompress one file per period"""
+    return zlib.crc32(str(key).encode()) % partitions
+
+
+def _same(old, new):
+    """Cell-wise equality that treats two missing values as unchanged"""
+    return (old == new) | (old.isna() & new.isna())
+
+
+class SnapshotStore:
+    """Point-in-time inventory snapshots stored as a base plus field-level deltas.
+
+    Each delta file holds only the keys that changed in that period and only
+    the fields that changed for any of them; a bitmask column records which
+    cells are real values, so blanks mean "unchanged". A fresh base is written
+    every checkpoint_every periods, or whenever a delta would hold most of
+    the cells of a full snapshot, so reconstruction never replays a long chain.
+    Every period is split into files partitioned by SKU hash, so per-SKU
+    history only reads the partition holding that SKU.
+    """
+
+    def __init__(self, root, key_columns=('product_id',), date_column='date',
+                 checkpoint_every=30, rebase_ratio=0.8, partitions=None):
+        self.root = root
+        self.key_columns = list(key_columns)
+        self.date_column = date_column
+        self.checkpoint_every = checkpoint_every
+        self.rebase_ratio = rebase_ratio
+        # Sized from the first snapshot when not given: about 2,000 SKUs per file
+        self.partitions = partitions
+        self.manifest = None
+        self._head = None
+
+        path = os.path.join(self.root, MANIFEST_FILE)
+        if os.path.exists(path):
+            with open(path) as f:
+                self.manifest = json.load(f)
+            self.key_columns = self.manifest['key_columns']
+            self.date_column = self.manifest['date_column']
+            self.partitions = self.manifest['partitions']
+
+    @property
+    def periods(self):
+        return [entry['period'] for entry in self.manifest['periods']] if self.manifest else []
+
+    def _write_manifest(self):
+        tmp_path = os.path.join(self.root, f"{MANIFEST_FILE}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, os.path.join(self.root, MANIFEST_FILE))
+
+    def _file_prefix(self, kind, period):
+        return f"{kind}_{pd.Timestamp(period).strftime('%Y%m%dT%H%M%S')}"
+
+    def _partition_path(self, prefix, partition):
+        return os.path.join(self.root, f"{prefix}_p{partition:02d}.csv.gz")
+
+    def _write(self, prefix, frame):
+        frame = frame.reset_index()
+        keys = frame[self.key_columns[0]]
+        partition = np.array([_partition_of(key, self.partitions) for key in keys], dtype=int)
+        for p in range(self.partitions):
+            frame[partition == p].to_csv(self._partition_path(prefix, p), index=False)
+
+    def _read(self, prefix, partition=None):
+        dtypes = {column: 'str' for column in self.key_columns}
+        for field, dtype in self.manifest['dtypes'].items():
+            if dtype == 'object':
+                dtypes[field] = 'str'
+        partitions = range(self.partitions) if partition is None else [partition]
+        frame = pd.concat(
+            [pd.read_csv(self._partition_path(prefix, p), dtype=dtypes) for p in partitions],
+            ignore_index=True,
+        )
+        return frame.set_index(self.key_columns)
+
+    def _restore_dtypes(self, state):
+        for field, dtype in self.manifest['dtypes'].items():
+            try:
+                state[field] = state[field].astype(dtype)
+            except (TypeError, ValueError):
+                pass
+        return state
+
+    def _apply_delta(self, state, delta):
+        fields = self.manifest['fields']
+        mask = delta[CHANGED_COLUMN]
+        state = state.drop(delta.index[mask == REMOVED], errors='ignore')
+        delta = delta[mask != REMOVED]
+        mask = delta[CHANGED_COLUMN]
+
+        added = delta.index.difference(state.index)
+        if len(added):
+            state = pd.concat([state, pd.DataFrame(index=added, columns=state.columns)])
+        for bit, field in enumerate(fields):
+            if field not in delta.columns:
+                continue
+            if state[field].dtype != delta[field].dtype:
+                state[field] = state[field].astype(object)
+            rows = delta.index[(mask & (1 << bit)) != 0]
+            state.loc[rows, field] = delta.loc[rows, field]
+        return state
+
+    def _replay(self, start_index, end_index, key_filter=None):
+        """Yield (period, state) from the base at or before start_index through end_index"""
+        entries = self.manifest['periods']
+        base_index = max(i for i in range(start_index + 1) if entries[i]['kind'] == 'base')
+
+        partition = None if key_filter is None else _partition_of(key_filter, self.partitions)
+        state = None
+        for entry in entries[base_index:end_index + 1]:
+            frame = self._read(entry['file'], partition)
+            if key_filter is not None:
+                frame = frame[frame.index.get_level_values(0) == key_filter]
+            if entry['kind'] == 'base':
+                state = frame
+            else:
+                state = self._apply_delta(state, frame)
+            yield entry['period'], state
+
+    def _period_index(self, period):
+        """Index of the latest stored period at or before the requested one"""
+        target = pd.Timestamp(period)
+        matches = [i for i, p in enumerate(self.periods) if pd.Timestamp(p) <= target]
+        if not matches:
+            raise KeyError(f"No snapshot at or before {period}")
+        return matches[-1]
+
+    def _state_at(self, end_index, key_filter=None):
+        state = None
+        for _, state in self._replay(end_index, end_index, key_filter):
+            pass
+        return self._restore_dtypes(state.copy())
+
+    def _prepare(self, snapshot):
+        frame = snapshot.drop(columns=[self.date_column], errors='ignore')
+        frame = frame.astype({column: 'str' for column in self.key_columns})
+        return frame.set_index(self.key_columns).sort_index()
+
+    def _to_frame(self, period, state):
+        frame = state.reset_index()
+        frame.insert(0, self.date_column, period)
+        return frame
+
+    def append(self, snapshot, period=None):
+        """Store one period's full snapshot, writing only what changed.
+
+        Returns the number of changed rows written.
+        """
+        if period is None:
+            period = snapshot[self.date_column].iloc[0]
+        period = str(period)
+        frame = self._prepare(snapshot)
+        if frame.index.has_duplicates:
+            raise ValueError(f"Snapshot {period} has duplicate {self.key_columns} keys")
+
+        if self.manifest is None:
+            os.makedirs(self.root, exist_ok=True)
+            if self.partitions is None:
+                self.partitions = min(64, max(1, len(frame) // 2000))
+            self.manifest = {
+                'key_columns': self.key_columns,
+                'date_column': self.date_column,
+                'fields': list(frame.columns),
+                'dtypes': {field: str(dtype) for field, dtype in frame.dtypes.items()},
+                'partitions': self.partitions,
+                'periods': [],
+            }
+        elif self.periods and pd.Timestamp(period) <= pd.Timestamp(self.periods[-1]):
+            raise ValueError(f"Snapshot {period} is not newer than {self.periods[-1]}")
+        elif list(frame.columns) != self.manifest['fields']:
+            raise ValueError(f"Snapshot fields {list(frame.columns)} do not match store")
+
+        head = self.head()
+        delta = None if head is None else self._diff(head, frame)
+        since_base = 0
+        for entry in reversed(self.manifest['periods']):
+            if entry['kind'] == 'base':
+                break
+            since_base += 1
+
+        # Compare stored cells, since a delta that touches every row may
+        # still carry only a few of the fields
+        base_cells = len(frame) * len(frame.columns)
+        delta_cells = None if delta is None else len(delta) * (len(delta.columns) - 1)
+        if delta is None or since_base + 1 >= self.checkpoint_every \
+                or delta_cells > self.rebase_ratio * base_cells:
+            kind, written = 'base', frame
+        else:
+            kind, written = 'delta', delta
+
+        prefix = self._file_prefix(kind, period)
+        self._write(prefix, written)
+        self.manifest['periods'].append({'period': period, 'kind': kind, 'file': prefix})
+        self._write_manifest()
+        self._head = frame
+
+        logging.info(f"Stored {kind} snapshot for {period}: {len(written)} of {len(frame)} rows")
+        return len(written)
+
+    def _diff(self, head, frame):
+        """Rows and fields of frame that differ from head, with a changed-field bitmask"""
+        fields = self.manifest['fields']
+        common = frame.index.intersection(head.index)
+        added = frame.index.difference(head.index)
+        removed = head.index.difference(frame.index)
+
+        changed = ~_same(head.loc[common, fields], frame.loc[common, fields])
+        mask = pd.Series(0, index=common)
+        for bit, field in enumerate(fields):
+            mask += changed[field].astype(int) * (1 << bit)
+        mask = pd.concat([
+            mask[mask != 0],
+            pd.Series((1 << len(fields)) - 1, index=added),
+        ])
+
+        delta = frame.loc[mask.index, fields].copy()
+        changed_fields = [
+            field for bit, field in enumerate(fields) if ((mask & (1 << bit)) != 0).any()
+        ]
+        for field in fields:
+            if field not in changed_fields:
+                delta = delta.drop(columns=field)
+            else:
+                delta[field] = delta[field].where((mask & (1 << fields.index(field))) != 0)
+        delta.insert(0, CHANGED_COLUMN, mask)
+
+        if len(removed):
+            tombstones = pd.DataFrame({CHANGED_COLUMN: REMOVED}, index=removed)
+            delta = pd.concat([delta, tombstones])
+        delta.index.names = self.key_columns
+        return delta
+
+    def head(self):
+        """Latest reconstructed snapshot indexed by key, or None for an empty store"""
+        if self._head is None and self.periods:
+            self._head = self._state_at(len(self.periods) - 1)
+        return self._head
+
+    def snapshot(self, period):
+        """Ordinary inventory frame as of the given period"""
+        index = self._period_index(period)
+        return self._to_frame(self.periods[index], self._state_at(index))
+
+    def _range(self, start, end, key_filter=None):
+        # Unlike snapshot(), a range is clamped to the stored history
+        if not self.periods or (end is not None and pd.Timestamp(end) < pd.Timestamp(self.periods[0])):
+            return pd.DataFrame()
+        end_index = self._period_index(end) if end is not None else len(self.periods) - 1
+        start_ts = pd.Timestamp(start) if start is not None else None
+        if start_ts is None or start_ts < pd.Timestamp(self.periods[0]):
+            start_index = 0
+        else:
+            start_index = self._period_index(start)
+
+        frames = []
+        for period, state in self._replay(start_index, end_index, key_filter):
+            if start_ts is not None and pd.Timestamp(period) < start_ts:
+                continue
+            frames.append(self._to_frame(period, self._restore_dtypes(state.copy())))
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    def history(self, sku, start=None, end=None):
+        """Rows for one SKU across every stored period in [start, end]"""
+        return self._range(start, end, key_filter=sku)
+
+    def to_frame(self, start=None, end=None):
+        """Full snapshots for [start, end] stacked like the raw inventory.csv"""
+        return self._range(start, end)
+
+    def _first_restated(self, inventory_df):
+        """Index of the first stored period the frame contradicts, or None.
+
+        A period the frame adds inside the stored range also counts, at the
+        index of the stored period it would precede.
+        """
+        stored = [pd.Timestamp(p) for p in self.periods]
+        incoming = {
+            pd.Timestamp(period): snapshot
+            for period, snapshot in inventory_df.groupby(self.date_column, sort=True)
+            if pd.Timestamp(period) <= stored[-1]
+        }
+        if not incoming:
+            return None
+        inserted = sorted(set(incoming) - set(stored))
+        limit = bisect.bisect_left(stored, inserted[0]) if inserted else len(stored)
+
+        fields = self.manifest['fields']
+        start = bisect.bisect_left(stored, min(incoming))
+        if start < limit:
+            for period, state in self._replay(start, limit - 1):
+                snapshot = incoming.get(pd.Timestamp(period))
+                if snapshot is None:
+                    continue
+                state = self._restore_dtypes(state.copy()).sort_index()
+                frame = self._prepare(snapshot)
+                if list(frame.columns) != fields:
+                    raise ValueError(f"Snapshot fields {list(frame.columns)} do not match store")
+                if not state.index.equals(frame.index) \
+                        or not _same(state[fields], frame[fields]).all().all():
+                    return self.periods.index(period)
+        return limit if inserted else None
+
+    def _truncate(self, index):
+        """Forget stored periods from index on so they can be written again"""
+        dropped = self.manifest['periods'][index:]
+        self.manifest['periods'] = self.manifest['periods'][:index]
+        self._write_manifest()
+        self._head = None
+        for entry in dropped:
+            for p in range(self.partitions):
+                os.remove(self._partition_path(entry['file'], p))
+
+    def ingest(self, inventory_df):
+        """Append every period in a stacked frame that is newer than the store.
+
+        Stored periods the frame restates are rewritten from it, together
+        with every period after them.
+        """
+        restated = self._first_restated(inventory_df) if self.periods else None
+        if restated is not None:
+            logging.warning(
+                f"Inventory restated from {self.periods[restated]}; "
+                f"rewriting {len(self.periods) - restated} stored periods"
+            )
+            self._truncate(restated)
+
+        last = pd.Timestamp(self.periods[-1]) if self.periods else None
+        rows_written = 0
+        for period, snapshot in inventory_df.groupby(self.date_column, sort=True):
+            if last is not None and pd.Timestamp(period) <= last:
+                continue
+            rows_written += self.append(snapshot, period)
+        return rows_written
@@ -2,24 +2,52 @@
 """
 Supply Chain Intelligence Engine - ETL Pipeline
 Enterprise supply chain optimization and predictive analytics platform
-Processes $192M+ inventory value with 91.2% demand forecasting accuracy
+Processes $192M+ inventory value with backtested demand forecasting accuracy
 """
 
 import pandas as pd
 import numpy as np
 import json
 import os
+import sys
 from datetime import datetime, timedelta
 import warnings
 warnings.filterwarnings('ignore')
 
+try:
+    from .feature_store import FeatureStore
+    from .snapshot_store import SnapshotStore
+except ImportError:
+    from feature_store import FeatureStore
+    from snapshot_store import SnapshotStore
+
+try:
+    from ..analytics.kpi_sketches import SupplyChainKPISketches
+except ImportError:
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'analytics'))
+    from kpi_sketches import SupplyChainKPISketches
+
+def _format_percentiles(kpis, name, template, suffix=""):
+    """p50 / p95 / p99 summary, or n/a while the digest is still empty"""
+    values = [kpis[f"{name}_p{q}"] for q in (50, 95, 99)]
+    if any(value is None for value in values):
+        return "n/a"
+    return " / ".join(f"p{q} {template.format(value)}" for q, value in zip((50, 95, 99), values)) + suffix
+
 class SupplyChainETL:
     """Enterprise Supply Chain Data Pipeline with Business Intelligence"""
     
-    def __init__(self):
-        self.data_dir = "../../data"
+    def __init__(self, data_dir=None):
+        # Resolve against the repository rather than the working directory
+        self.data_dir = data_dir or os.path.abspath(
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data")
+        )
         self.processed_dir = f"{self.data_dir}/processed"
         self.raw_dir = f"{self.data_dir}/raw"
+        self.feature_store_dir = f"{self.processed_dir}/feature_store"
+        self.snapshot_dir = f"{self.processed_dir}/inventory_snapshots"
+        self.backtest_path = f"{self.processed_dir}/forecast_backtest.json"
+        self.kpi_sketches_path = f"{self.processed_dir}/kpi_sketches.json"
         
         # Create all necessary directories
         directories = [
@@ -67,9 +95,20 @@ class SupplyChainETL:
         product_categories = ['Electronics', 'Automotive', 'Consumer_Goods', 'Industrial', 'Healthcare']
         inventory_data = []
         
+        # Product master attributes stay fixed across daily snapshots
+        product_master = {
+            product_id: {
+                'product_category': np.random.choice(product_categories),
+                'unit_cost': round(np.random.uniform(12.99, 199.99), 2),
+                'carrying_cost_percent': round(np.random.uniform(0.15, 0.35), 3),
+                'supplier_id': f'SUP_{np.random.randint(1, 201):04d}'
+            }
+            for product_id in range(1, 101)
+        }
+        
         for date in dates[-120:]:  # Last 120 days of data
             for product_id in range(1, 101):  # 100 products
-                category = np.random.choice(product_categories)
+                product = product_master[product_id]
                 seasonal_factor = 1 + 0.4 * np.sin(2 * np.pi * date.dayofyear / 365)
                 
                 base_stock = np.random.randint(100, 2000)
@@ -78,15 +117,15 @@ class SupplyChainETL:
                 inventory_data.append({
                     'date': date.strftime('%Y-%m-%d'),
                     'product_id': f'PROD_{product_id:04d}',
-                    'product_category': category,
+                    'product_category': product['product_category'],
                     'stock_level': current_stock,
                     'safety_stock': int(current_stock * 0.15),
                     'reorder_point': int(current_stock * 0.30),
                     'max_stock': int(current_stock * 1.8),
-                    'unit_cost': round(np.random.uniform(12.99, 199.99), 2),
-                    'carrying_cost_percent': round(np.random.uniform(0.15, 0.35), 3),
+                    'unit_cost': product['unit_cost'],
+                    'carrying_cost_percent': product['carrying_cost_percent'],
                     'demand_variance': round(np.random.uniform(0.10, 0.45), 3),
-                    'supplier_id': f'SUP_{np.random.randint(1, 201):04d}'
+                    'supplier_id': product['supplier_id']
                 })
         
         inventory_df = pd.DataFrame(inventory_data)
@@ -187,16 +226,18 @@ class SupplyChainETL:
         logistics_df.to_csv(f"{self.raw_dir}/logistics/logistics.csv", index=False)
         print(f"✅ Generated {len(logistics_df)} logistics records with sustainability metrics")
     
+    def extract_source(self, source):
+        """Extract a single raw data source"""
+        return pd.read_csv(f"{self.raw_dir}/{source}/{source}.csv")
+    
     def extract_data(self):
         """Extract comprehensive supply chain data from all sources"""
         print("\n📥 Extracting Enterprise Supply Chain Data...")
         
         data = {}
         try:
-            data['suppliers'] = pd.read_csv(f"{self.raw_dir}/suppliers/suppliers.csv")
-            data['inventory'] = pd.read_csv(f"{self.raw_dir}/inventory/inventory.csv")
-            data['demand'] = pd.read_csv(f"{self.raw_dir}/demand/demand.csv")
-            data['logistics'] = pd.read_csv(f"{self.raw_dir}/logistics/logistics.csv")
+            for source in ['suppliers', 'inventory', 'demand', 'logistics']:
+                data[source] = self.extract_source(source)
             
             print(f"✅ Suppliers: {len(data['suppliers'])} records loaded")
             print(f"✅ Inventory: {len(data['inventory'])} records loaded")
@@ -211,6 +252,18 @@ class SupplyChainETL:
         
         return data
     
+    def store_inventory_snapshots(self, inventory):
+        """Append new inventory periods to the delta-encoded snapshot store"""
+        store = SnapshotStore(self.snapshot_dir)
+        rows_written = store.ingest(inventory)
+        
+        print(f"✅ Inventory snapshots: {rows_written} changed rows stored across {len(store.periods)} periods")
+        return store
+    
+    def load_inventory_from_snapshots(self, inventory):
+        """Persist inventory through the snapshot store and read the full history back from it"""
+        return self.store_inventory_snapshots(inventory).to_frame()
+    
     def transform_data(self, data):
         """Advanced data transformation with business intelligence"""
         print("\n🔄 Transforming Supply Chain Data with Advanced Analytics...")
@@ -287,6 +340,39 @@ class SupplyChainETL:
         print("✅ Advanced data transformation completed with business intelligence")
         return transformed_data
     
+    def build_feature_store(self, data):
+        """Materialize shared demand features into the memory-mapped feature store"""
+        print("\n🧮 Updating Demand Feature Store...")
+        
+        store = FeatureStore(self.feature_store_dir)
+        days_written = store.update(data['demand'])
+        
+        print(f"✅ Feature store: {days_written} days written, {store.n_days} days x {len(store.skus)} SKUs available")
+        return store
+    
+    def load_forecast_accuracy(self):
+        """Summarize the latest rolling-origin backtest written by ml_models/backtesting.py"""
+        if not os.path.exists(self.backtest_path):
+            return "Not yet backtested"
+        
+        with open(self.backtest_path) as f:
+            backtest = json.load(f)
+        overall = backtest['overall']
+        if overall['accuracy'] is None:
+            return "Not yet backtested"
+        return (
+            f"{overall['accuracy']:.1%} backtested ({backtest['best_candidate']}, "
+            f"WAPE {overall['wape']:.1%}, {len(backtest['cutoffs'])} cutoffs)"
+        )
+    
+    def build_kpi_sketches(self, data):
+        """Fold new logistics and demand events into the persisted KPI sketches"""
+        sketches = SupplyChainKPISketches.load(self.kpi_sketches_path)
+        sketches.update_logistics_frame(data['logistics'])
+        sketches.update_demand_frame(data['demand'])
+        sketches.save(self.kpi_sketches_path)
+        return sketches
+    
     def calculate_analytics(self, data):
         """Calculate comprehensive supply chain analytics and KPIs"""
         print("\n📊 Calculating Enterprise Supply Chain Analytics...")
@@ -317,6 +403,12 @@ class SupplyChainETL:
         # Sustainability metrics
         total_carbon_footprint = float(data['logistics']['carbon_footprint_kg'].sum())
         
+        # Percentile, distinct-count and heavy-hitter KPIs from streaming sketches
+        stream_kpis = self.build_kpi_sketches(data).kpis()
+        
+        # Forecast accuracy measured by rolling-origin backtesting
+        forecast_accuracy = self.load_forecast_accuracy()
+        
         # Business intelligence calculations
         optimization_value = total_inventory_value * 0.32 + total_shipping_cost * 0.28
         cost_reduction_potential = total_carrying_cost * 0.35
@@ -329,6 +421,15 @@ class SupplyChainETL:
             'total_revenue': f"${total_revenue:,.2f}",
             'avg_delivery_time': f"{avg_delivery_time:.1f} days",
             'on_time_delivery_rate': f"{on_time_delivery_rate:.1%}",
+            'delivery_time_percentiles': _format_percentiles(
+                stream_kpis, 'delivery_time_days', "{:.1f}", " days"
+            ),
+            'cost_per_unit_percentiles': _format_percentiles(
+                stream_kpis, 'cost_per_unit', "${:.2f}"
+            ),
+            'distinct_active_skus': int(stream_kpis['distinct_active_skus']),
+            'distinct_active_suppliers': int(stream_kpis['distinct_active_suppliers']),
+            'top_shipping_lanes': [f"{lane}: {count} shipments" for lane, count in stream_kpis['top_lanes'][:5]],
             'high_risk_suppliers': int(high_risk_suppliers),
             'products_at_stockout_risk': int(stockout_risk_products),
             'products_overstocked': int(overstock_products),
@@ -339,7 +440,7 @@ class SupplyChainETL:
             'carbon_footprint_total': f"{total_carbon_footprint:,.0f} kg CO2",
             'optimization_potential': f"${optimization_value:,.0f} annually",
             'inventory_cost_reduction': "32% potential savings",
-            'demand_forecast_accuracy': "91.2% with advanced ML models",
+            'demand_forecast_accuracy': forecast_accuracy,
             'supplier_risk_mitigation': "85% disruption prediction accuracy",
             'logistics_efficiency_gain': "28% cost reduction potential",
             'working_capital_improvement': f"${cost_reduction_potential:,.0f}",
@@ -365,6 +466,9 @@ class SupplyChainETL:
         # Save all processed datasets
         for dataset_name, dataset in data.items():
             if isinstance(dataset, pd.DataFrame):
+                if dataset_name == 'inventory':
+                    # Earlier periods are already persisted in the snapshot store
+                    dataset = dataset[dataset['date'] == dataset['date'].max()]
                 output_path = f"{self.processed_dir}/{dataset_name}_processed.csv"
                 dataset.to_csv(output_path, index=False)
                 print(f"✅ Saved {dataset_name} data: {len(dataset)} records")
@@ -379,7 +483,7 @@ class SupplyChainETL:
         executive_summary = {
             "supply_chain_optimization_value": "$52.3M annually",
             "inventory_cost_reduction": "32% potential savings ($16.7M)",
-            "demand_forecasting_improvement": "91.2% accuracy with ML models",
+            "demand_forecasting_improvement": analytics['demand_forecast_accuracy'],
             "supplier_risk_mitigation": "85% disruption prediction accuracy",
             "logistics_optimization": "28% transportation cost reduction",
             "service_level_improvement": "99.5% order fulfillment target",
@@ -407,9 +511,15 @@ class SupplyChainETL:
             # Extract enterprise data
             data = self.extract_data()
             
+            # Inventory history lives in the delta-encoded snapshot store
+            data['inventory'] = self.load_inventory_from_snapshots(data['inventory'])
+            
             # Transform with advanced analytics
             transformed_data = self.transform_data(data)
             
+            # Compute model features once for all downstream workers
+            self.build_feature_store(transformed_data)
+            
             # Calculate business intelligence
             analytics = self.calculate_analytics(transformed_data)
             
@@ -420,7 +530,7 @@ class SupplyChainETL:
             print("🎉 Supply Chain Intelligence ETL Pipeline Completed Successfully!")
             print("💰 Business Impact: $52.3M+ optimization potential")
             print("📊 Executive Dashboard: Ready for C-suite presentation")
-            print("🔮 Predictive Models: 91.2% forecasting accuracy")
+            print(f"🔮 Predictive Models: {analytics['demand_forecast_accuracy']}")
             print("🎯 Risk Management: 85% disruption prediction")
             print("🌱 Sustainability: 25% carbon reduction potential")
             print("=" * 70)
@@ -0,0 +1,294 @@
+"""
+backtesting.py
+
+Parallel Rolling-Origin Backtesting and Hyperparameter Search for Demand Forecasting Models
+"""
+
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+try:
+    from .demand_prediction import arima_forecast, lstm_forecast
+except ImportError:
+    from demand_prediction import arima_forecast, lstm_forecast
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+FORECASTERS = {
+    'arima': arima_forecast,
+    'lstm': lstm_forecast,
+}
+
+DEFAULT_CANDIDATES = [
+    {'model': 'arima', 'params': {'order': (5, 1, 0)}},
+    {'model': 'arima', 'params': {'order': (2, 1, 1)}},
+    {'model': 'arima', 'params': {'order': (7, 1, 1)}},
+    {'model': 'lstm', 'params': {'units': 50, 'epochs': 5}},
+    {'model': 'lstm', 'params': {'units': 32, 'epochs': 10}},
+]
+
+FOLD_TOTALS = ('abs_error', 'error', 'actual', 'ape_sum', 'ape_count')
+
+
+def candidate_name(candidate):
+    params = ', '.join(f"{key}={value}" for key, value in sorted(candidate['params'].items()))
+    return f"{candidate['model']}({params})"
+
+
+def _fold_key(candidate, sku, cutoff, horizon, history):
+    """Cache key covering the candidate, the fold and the exact data it sees"""
+    payload = json.dumps({
+        'candidate': candidate,
+        'sku': sku,
+        'cutoff': cutoff,
+        'horizon': horizon,
+        'data': hashlib.sha1(np.ascontiguousarray(history).tobytes()).hexdigest(),
+    }, sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def _evaluate_fold(candidate, store, sku, cutoff_index, horizon):
+    """Fit one candidate on history before the cutoff and score the next horizon days"""
+    demand = store.feature('demand')[:, store.sku_index(sku)]
+    train = pd.DataFrame({'demand': np.asarray(demand[:cutoff_index], dtype=float)})
+    actual = np.asarray(demand[cutoff_index:cutoff_index + horizon], dtype=float)
+
+    forecast = FORECASTERS[candidate['model']](train, steps=horizon, **candidate['params'])
+    forecast = np.asarray(forecast, dtype=float).flatten()[:horizon]
+    if len(forecast) != len(actual) or not np.isfinite(forecast).all():
+        raise ValueError(f"{candidate_name(candidate)} produced a missing or non-finite forecast")
+
+    error = forecast - actual
+    nonzero = actual != 0
+    return {
+        'abs_error': float(np.abs(error).sum()),
+        'error': float(error.sum()),
+        'actual': float(actual.sum()),
+        'ape_sum': float((np.abs(error[nonzero]) / actual[nonzero]).sum()),
+        'ape_count': int(nonzero.sum()),
+    }
+
+
+def summarize(totals):
+    """MAPE, WAPE and bias from summed fold totals"""
+    actual = totals['actual']
+    wape = totals['abs_error'] / actual if actual else None
+    return {
+        'mape': totals['ape_sum'] / totals['ape_count'] if totals['ape_count'] else None,
+        'wape': wape,
+        'bias': totals['error'] / actual if actual else None,
+        'accuracy': 1 - wape if wape is not None else None,
+    }
+
+
+def _add_totals(target, fold):
+    for field in FOLD_TOTALS:
+        target[field] = target.get(field, 0) + fold[field]
+
+
+class BacktestEngine:
+    """Rolling-origin evaluation of forecasting candidates over a process pool.
+
+    Folds are scored one cutoff at a time so candidates whose running WAPE
+    falls too far behind the leader stop receiving work. A candidate that
+    fails any fold is disqualified, so every candidate still in the running
+    is scored on the same SKUs and cutoffs. Every fold result is cached on
+    disk, so adding a candidate or a cutoff only computes new folds.
+    """
+
+    def __init__(self, store, cache_dir, horizon=30, n_cutoffs=4, step=None,
+                 min_train_days=90, max_workers=None, prune_ratio=1.5, min_folds=1):
+        self.store = store
+        self.cache_dir = cache_dir
+        self.horizon = horizon
+        self.n_cutoffs = n_cutoffs
+        self.step = step or horizon
+        self.min_train_days = min_train_days
+        self.max_workers = max_workers
+        self.prune_ratio = prune_ratio
+        self.min_folds = min_folds
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def cutoffs(self):
+        """Cutoff day indices, oldest first, each leaving a full horizon to score"""
+        last = self.store.n_days - self.horizon
+        cutoffs = [last - i * self.step for i in range(self.n_cutoffs)]
+        return sorted(c for c in cutoffs if c >= self.min_train_days)
+
+    def _cache_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load_cached(self, key):
+        path = self._cache_path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _save_cached(self, key, result):
+        tmp_path = f"{self._cache_path(key)}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(result, f)
+        os.replace(tmp_path, self._cache_path(key))
+
+    def _prune(self, totals, active):
+        """Drop candidates whose running WAPE is hopelessly behind the best one"""
+        wapes = {name: summarize(totals[name])['wape'] for name in active}
+        scored = [w for w in wapes.values() if w is not None]
+        if not scored:
+            return active
+        threshold = min(scored) * self.prune_ratio
+        pruned = [name for name in active if wapes[name] is not None and wapes[name] > threshold]
+        for name in pruned:
+            logging.info(f"Pruning {name}: WAPE {wapes[name]:.3f} exceeds {threshold:.3f}")
+        return [name for name in active if name not in pruned]
+
+    def run(self, candidates=None, skus=None, categories=None):
+        """Evaluate candidates across all cutoffs and return the results summary"""
+        candidates = {candidate_name(c): c for c in (candidates or DEFAULT_CANDIDATES)}
+        skus = skus or self.store.skus
+        categories = categories or {}
+        cutoffs = self.cutoffs()
+        if not cutoffs:
+            raise ValueError(
+                f"Not enough history for backtesting: {self.store.n_days} days, "
+                f"need {self.min_train_days + self.horizon}"
+            )
+
+        active = list(candidates)
+        totals = {name: {} for name in candidates}
+        by_sku = {name: {} for name in candidates}
+        failed = {name: 0 for name in candidates}
+        computed, cached = 0, 0
+        demand = self.store.feature('demand')
+        dates = self.store.dates
+
+        # Spawned workers are safe to start from the scheduler's worker threads
+        spawn = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=spawn) as pool:
+            for folds_run, cutoff_index in enumerate(cutoffs, 1):
+                cutoff = dates[cutoff_index].strftime('%Y-%m-%d')
+                pending = {}
+                for name in active:
+                    for sku in skus:
+                        history = demand[:cutoff_index + self.horizon, self.store.sku_index(sku)]
+                        key = _fold_key(candidates[name], sku, cutoff, self.horizon, history)
+                        result = self._load_cached(key)
+                        if result is None:
+                            future = pool.submit(
+                                _evaluate_fold, candidates[name], self.store, sku,
+                                cutoff_index, self.horizon
+                            )
+                            pending[future] = (name, sku, key)
+                        else:
+                            cached += 1
+                            _add_totals(totals[name], result)
+                            _add_totals(by_sku[name].setdefault(sku, {}), result)
+
+                for future, (name, sku, key) in pending.items():
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logging.warning(f"Fold failed for {name} on {sku} at {cutoff}: {e}")
+                        failed[name] += 1
+                        continue
+                    computed += 1
+                    self._save_cached(key, result)
+                    _add_totals(totals[name], result)
+                    _add_totals(by_sku[name].setdefault(sku, {}), result)
+
+                disqualified = [name for name in active if failed[name]]
+                for name in disqualified:
+                    logging.info(f"Disqualifying {name}: {failed[name]} failed folds")
+                active = [name for name in active if not failed[name]]
+
+                logging.info(f"Cutoff {cutoff}: {len(pending)} folds computed, {len(active)} candidates active")
+                if folds_run >= self.min_folds and len(active) > 1:
+                    active = self._prune(totals, active)
+
+        return self._summarize(candidates, active, totals, by_sku, failed, categories,
+                               cutoffs, computed, cached)
+
+    def _summarize(self, candidates, active, totals, by_sku, failed, categories,
+                   cutoffs, computed, cached):
+        leaderboard = []
+        for name in candidates:
+            if not totals[name] and not failed[name]:
+                continue
+            metrics = summarize(totals[name]) if totals[name] else summarize(dict.fromkeys(FOLD_TOTALS, 0))
+            leaderboard.append(dict(
+                candidate=name, completed=name in active, failed_folds=failed[name], **metrics
+            ))
+        leaderboard.sort(key=lambda row: (not row['completed'], row['wape'] if row['wape'] is not None else np.inf))
+        if not leaderboard or not leaderboard[0]['completed']:
+            raise RuntimeError("No candidate completed every backtest fold")
+        best = leaderboard[0]['candidate']
+
+        by_category = {}
+        for sku, sku_totals in by_sku[best].items():
+            _add_totals(by_category.setdefault(categories.get(sku, 'Unknown'), {}), sku_totals)
+
+        return {
+            'generated_at': pd.Timestamp.now().isoformat(timespec='seconds'),
+            'horizon_days': self.horizon,
+            'cutoffs': [self.store.dates[c].strftime('%Y-%m-%d') for c in cutoffs],
+            'folds_computed': computed,
+            'folds_cached': cached,
+            'best_candidate': best,
+            'best_params': candidates[best],
+            'overall': summarize(totals[best]),
+            'by_category': {cat: summarize(t) for cat, t in sorted(by_category.items())},
+            'by_sku': {sku: summarize(t) for sku, t in sorted(by_sku[best].items())},
+            'leaderboard': leaderboard,
+        }
+
+
+def sku_categories(demand_df):
+    """Most frequent product category per SKU"""
+    return demand_df.groupby('product_id')['product_category'].agg(
+        lambda categories: categories.mode().iloc[0]
+    ).to_dict()
+
+
+def run_backtest(store, processed_dir, raw_dir, **engine_options):
+    """Backtest the default candidates and write forecast_backtest.json"""
+    demand_df = pd.read_csv(f"{raw_dir}/demand/demand.csv",
+                            usecols=['product_id', 'product_category'])
+    engine = BacktestEngine(store, cache_dir=f"{processed_dir}/backtest_cache", **engine_options)
+    results = engine.run(categories=sku_categories(demand_df))
+
+    # Replace atomically so readers in other stages never parse a partial file
+    path = f"{processed_dir}/forecast_backtest.json"
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(results, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+    overall = results['overall']
+    logging.info(f"Best candidate: {results['best_candidate']}")
+    logging.info(f"WAPE {overall['wape']:.3f}, MAPE {overall['mape']:.3f}, bias {overall['bias']:+.3f}")
+    return results
+
+
+def main():
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data_pipeline'))
+    from feature_store import FeatureStore
+
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data')
+    processed_dir = os.path.abspath(os.path.join(data_dir, 'processed'))
+    store = FeatureStore(f"{processed_dir}/feature_store")
+    if not store.exists:
+        logging.error("Feature store not found. Run the ETL pipeline first.")
+        return None
+    return run_backtest(store, processed_dir, os.path.abspath(os.path.join(data_dir, 'raw')))
+
+
+if __name__ == "__main__":
+    main()
@@ -33,36 +33,42 @@ def generate_sample_demand_data(n=365):
     return df
 
 # Time Series Forecasting with ARIMA
-def arima_forecast(df):
+def arima_forecast(df, order=(5,1,0), steps=30):
     logging.info("Running ARIMA model for demand forecasting.")
-    model = ARIMA(df['demand'], order=(5,1,0))
+    model = ARIMA(df['demand'], order=order)
     model_fit = model.fit()
-    forecast = model_fit.forecast(steps=30)
+    forecast = model_fit.forecast(steps=steps)
     return forecast
 
 # Neural Network Forecasting with LSTM
-def lstm_forecast(df):
+def lstm_forecast(df, units=50, epochs=5, lookback=10, steps=1):
     logging.info("Running LSTM model for demand forecasting.")
     data = df['demand'].values.reshape(-1, 1)
     scaler = StandardScaler()
     data_scaled = scaler.fit_transform(data)
     
     X, y = [], []
-    for i in range(10, len(data_scaled)):
-        X.append(data_scaled[i-10:i])
+    for i in range(lookback, len(data_scaled)):
+        X.append(data_scaled[i-lookback:i])
         y.append(data_scaled[i])
     
     X, y = np.array(X), np.array(y)
 
     model = Sequential()
-    model.add(LSTM(50, activation='relu', input_shape=(X.shape[1], 1)))
+    model.add(LSTM(units, activation='relu', input_shape=(X.shape[1], 1)))
     model.add(Dense(1))
     model.compile(optimizer=Adam(), loss='mse')
-    model.fit(X, y, epochs=5, verbose=0)
+    model.fit(X, y, epochs=epochs, verbose=0)
 
-    last_sequence = data_scaled[-10:].reshape((1, 10, 1))
-    forecast = model.predict(last_sequence, verbose=0)
-    return scaler.inverse_transform(forecast)
+    # Feed each prediction back in to forecast beyond the next day
+    window = data_scaled[-lookback:].flatten()
+    forecast = []
+    for _ in range(steps):
+        last_sequence = window[-lookback:].reshape((1, lookback, 1))
+        next_value = model.predict(last_sequence, verbose=0)[0, 0]
+        forecast.append(next_value)
+        window = np.append(window, next_value)
+    return scaler.inverse_transform(np.array(forecast).reshape(-1, 1))
 
 # Inventory Optimization: EOQ
 def calculate_eoq(demand_rate, setup_cost, holding_cost):
@@ -0,0 +1,122 @@
+"""
+test_kpi_sketches.py
+
+Tests for the streaming KPI sketches and their incremental persistence
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.analytics.kpi_sketches import SupplyChainKPISketches
+
+
+def shipments(start, count):
+    ids = range(start, start + count)
+    return pd.DataFrame({
+        'shipment_id': [f"SHIP_{i:06d}" for i in ids],
+        'supplier_id': [f"SUP_{i % 5:04d}" for i in ids],
+        'product_id': [f"PROD_{i % 40:04d}" for i in ids],
+        'transportation_mode': ['Truck' if i % 3 else 'Air' for i in ids],
+        'quantity': [10 + i % 7 for i in ids],
+        'shipping_cost': [50.0 + i for i in ids],
+        'delivery_time_days': [1 + i % 10 for i in ids],
+    })
+
+
+def demand(date, skus):
+    return pd.DataFrame({'date': date, 'product_id': skus, 'demand_quantity': 5})
+
+
+def skus(start, count):
+    return [f"PROD_{i:04d}" for i in range(start, start + count)]
+
+
+def test_per_event_demand_counts_every_sku_of_a_day():
+    sketches = SupplyChainKPISketches()
+    for date, day_skus in (('2024-01-01', skus(0, 100)), ('2024-01-02', skus(100, 100))):
+        for event in demand(date, day_skus).to_dict('records'):
+            sketches.update_demand(event)
+
+    assert sketches.active_skus.count() == pytest.approx(200, rel=0.02)
+    assert sketches.watermarks['demand_date'] == '2024-01-02'
+
+
+def test_demand_day_split_across_batches():
+    sketches = SupplyChainKPISketches()
+    sketches.update_demand_frame(demand('2024-01-01', skus(0, 50)))
+    sketches.update_demand_frame(demand('2024-01-01', skus(50, 50)))
+    sketches.update_demand_frame(demand('2023-12-31', skus(100, 50)))
+
+    assert sketches.active_skus.count() == pytest.approx(100, rel=0.02)
+
+
+def test_reloaded_sketches_skip_folded_shipments(tmp_path):
+    path = str(tmp_path / 'kpi_sketches.json')
+    frame = shipments(1, 500)
+    for batch in (frame.iloc[:200], frame, frame):
+        sketches = SupplyChainKPISketches.load(path)
+        sketches.update_logistics_frame(batch)
+        sketches.save(path)
+
+    sketches = SupplyChainKPISketches.load(path)
+    assert sketches.delivery_time.count == 500
+    assert sketches.watermarks['shipment_id'] == 'SHIP_000500'
+    sketches.update_shipment(frame.iloc[-1].to_dict())
+    assert sketches.delivery_time.count == 500
+
+
+def test_zero_quantity_shipments_stay_out_of_cost_percentiles():
+    frame = shipments(1, 100)
+    frame.loc[0, 'quantity'] = 0
+    sketches = SupplyChainKPISketches()
+    sketches.update_logistics_frame(frame)
+
+    kpis = sketches.kpis()
+    assert sketches.cost_per_unit.count == 99
+    assert all(np.isfinite(kpis[f"cost_per_unit_p{q}"]) for q in (50, 95, 99))
+
+
+def test_empty_sketches_report_no_percentiles():
+    kpis = SupplyChainKPISketches().kpis()
+    assert kpis['delivery_time_days_p50'] is None
+    assert kpis['top_lanes'] == []
+
+
+def test_lanes_are_keyed_by_supplier_and_mode():
+    sketches = SupplyChainKPISketches()
+    sketches.update_logistics_frame(shipments(1, 300))
+
+    lanes = dict(sketches.lanes.top())
+    assert set(lanes) <= {f"SUP_{s:04d} -> {mode}" for s in range(5) for mode in ('Truck', 'Air')}
+    assert sum(lanes.values()) == 300
+
+
+def test_merged_shards_match_a_single_pass():
+    frame = shipments(1, 1000)
+    single = SupplyChainKPISketches()
+    single.update_logistics_frame(frame)
+
+    left, right = SupplyChainKPISketches(), SupplyChainKPISketches()
+    left.update_logistics_frame(frame.iloc[:400])
+    right.update_logistics_frame(frame.iloc[400:])
+    right.update_demand_frame(demand('2024-03-01', skus(0, 10)))
+    merged = left.merge(right)
+
+    assert merged.delivery_time.count == 1000
+    assert merged.active_suppliers.count() == single.active_suppliers.count()
+    assert dict(merged.lanes.top()) == dict(single.lanes.top())
+    assert merged.delivery_time.quantile(0.5) == pytest.approx(single.delivery_time.quantile(0.5), rel=0.05)
+    assert merged.watermarks == {'shipment_id': 'SHIP_001000', 'demand_date': '2024-03-01'}
+
+
+def test_save_load_round_trip(tmp_path):
+    path = str(tmp_path / 'kpi_sketches.json')
+    sketches = SupplyChainKPISketches()
+    sketches.update_logistics_frame(shipments(1, 300))
+    sketches.update_demand_frame(demand('2024-01-01', skus(0, 60)))
+    sketches.save(path)
+
+    loaded = SupplyChainKPISketches.load(path)
+    assert loaded.kpis() == sketches.kpis()
+    assert loaded.watermarks == sketches.watermarks
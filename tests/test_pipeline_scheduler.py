@@ -0,0 +1,174 @@
+"""
+test_pipeline_scheduler.py
+
+Tests for the in-process pipeline scheduler using an injected clock
+"""
+
+import threading
+import time
+
+import pytest
+
+from src.data_pipeline.pipeline_scheduler import PipelineScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Recorder:
+    """Stage factory that records runs and tracks peak concurrency"""
+
+    def __init__(self):
+        self.runs = []
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def stage(self, name, output, delay=0.0, gate=None):
+        def run():
+            with self._lock:
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+            if gate is not None:
+                gate.wait(timeout=5)
+            time.sleep(delay)
+            with self._lock:
+                self.active -= 1
+                self.runs.append(name)
+            return output() if callable(output) else output
+        return run
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def scheduler(clock):
+    scheduler = PipelineScheduler(max_workers=2, clock=clock)
+    yield scheduler
+    scheduler.shutdown()
+
+
+def test_interval_stages_run_when_due(scheduler, clock):
+    recorder = Recorder()
+    scheduler.add_stage('hourly', recorder.stage('hourly', 1), interval='hourly')
+    scheduler.add_stage('daily', recorder.stage('daily', 1), interval='daily')
+
+    scheduler.run_pending()
+    assert scheduler.wait(timeout=5)
+    clock.now = 3600
+    scheduler.run_pending()
+    assert scheduler.wait(timeout=5)
+
+    assert sorted(recorder.runs) == ['daily', 'hourly', 'hourly']
+
+
+def test_downstream_skips_when_inputs_unchanged(scheduler, clock):
+    recorder = Recorder()
+    scheduler.add_stage('ingest', recorder.stage('ingest', 'same'), interval=10)
+    scheduler.add_stage('transform', recorder.stage('transform', 't'), upstream=['ingest'])
+
+    scheduler.run_pending()
+    assert scheduler.wait(timeout=5)
+    clock.now = 10
+    scheduler.run_pending()
+    scheduler.trigger('transform')
+    assert scheduler.wait(timeout=5)
+
+    assert recorder.runs.count('transform') == 1
+    assert scheduler.stages['transform'].skips == 1
+
+
+def test_downstream_reruns_when_inputs_change(scheduler, clock):
+    recorder = Recorder()
+    version = iter([1, 2])
+    scheduler.add_stage('ingest', recorder.stage('ingest', lambda: next(version)), interval=10)
+    scheduler.add_stage('transform', recorder.stage('transform', 't'), upstream=['ingest'])
+
+    scheduler.run_pending()
+    assert scheduler.wait(timeout=5)
+    clock.now = 10
+    scheduler.run_pending()
+    assert scheduler.wait(timeout=5)
+
+    assert recorder.runs.count('transform') == 2
+
+
+def test_triggers_coalesce_while_upstream_busy(scheduler):
+    recorder = Recorder()
+    gate = threading.Event()
+    scheduler.add_stage('ingest', recorder.stage('ingest', 1, gate=gate))
+    scheduler.add_stage('transform', recorder.stage('transform', 't'), upstream=['ingest'])
+
+    scheduler.trigger('ingest')
+    for _ in range(5):
+        scheduler.trigger('transform')
+    gate.set()
+    assert scheduler.wait(timeout=5)
+
+    assert recorder.runs == ['ingest', 'transform']
+
+
+def test_concurrency_is_capped(scheduler):
+    recorder = Recorder()
+    for i in range(6):
+        scheduler.add_stage(f"source_{i}", recorder.stage(f"source_{i}", i, delay=0.02), interval=60)
+
+    scheduler.run_pending()
+    assert scheduler.wait(timeout=5)
+
+    assert len(recorder.runs) == 6
+    assert recorder.peak == 2
+
+
+def test_upstream_waits_for_running_descendants(scheduler, clock):
+    recorder = Recorder()
+    gate = threading.Event()
+    version = iter([1, 2])
+    scheduler.add_stage('ingest', recorder.stage('ingest', lambda: next(version)), interval=10)
+    scheduler.add_stage('transform', recorder.stage('transform', 't', gate=gate), upstream=['ingest'])
+
+    scheduler.run_pending()
+    while 'transform' not in scheduler._running:
+        time.sleep(0.01)
+    clock.now = 10
+    scheduler.run_pending()
+    time.sleep(0.05)
+    assert recorder.runs == ['ingest']
+
+    gate.set()
+    assert scheduler.wait(timeout=5)
+    assert recorder.runs == ['ingest', 'transform', 'ingest', 'transform']
+
+
+def test_upstream_runs_while_grandchild_is_busy(scheduler, clock):
+    recorder = Recorder()
+    gate = threading.Event()
+    version = iter([1, 2])
+    transform_version = iter([1, 2])
+    scheduler.add_stage('ingest', recorder.stage('ingest', lambda: next(version)), interval=10)
+    scheduler.add_stage('transform', recorder.stage('transform', lambda: next(transform_version)),
+                        upstream=['ingest'])
+    scheduler.add_stage('forecasts', recorder.stage('forecasts', 'f', gate=gate),
+                        upstream=['transform'])
+
+    scheduler.run_pending()
+    while 'forecasts' not in scheduler._running:
+        time.sleep(0.01)
+    clock.now = 10
+    scheduler.run_pending()
+    deadline = time.monotonic() + 5
+    while recorder.runs.count('ingest') < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert recorder.runs == ['ingest', 'transform', 'ingest']
+
+    gate.set()
+    assert scheduler.wait(timeout=5)
+    assert recorder.runs == ['ingest', 'transform', 'ingest', 'forecasts', 'transform', 'forecasts']
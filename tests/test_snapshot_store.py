@@ -0,0 +1,108 @@
+"""
+test_snapshot_store.py
+
+Round-trip tests for the delta-encoded inventory snapshot store
+"""
+
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+
+from src.data_pipeline.snapshot_store import SnapshotStore
+
+
+def inventory(date, rows):
+    """Stacked inventory rows for one period from {product_id: (stock_level, warehouse)}"""
+    return pd.DataFrame({
+        'date': date,
+        'product_id': list(rows),
+        'stock_level': [stock for stock, _ in rows.values()],
+        'warehouse': [warehouse for _, warehouse in rows.values()],
+    })
+
+
+@pytest.fixture
+def periods():
+    base = {f"PROD_{i:04d}": (100 + i, 'WH_A') for i in range(20)}
+    changed = dict(base, PROD_0003=(7, 'WH_A'), PROD_0005=(105, 'WH_B'))
+    removed = {sku: value for sku, value in changed.items() if sku != 'PROD_0010'}
+    readded = dict(removed, PROD_0010=(42, 'WH_C'))
+    return [
+        inventory('2024-01-01', base),
+        inventory('2024-01-02', changed),
+        inventory('2024-01-03', removed),
+        inventory('2024-01-04', readded),
+    ]
+
+
+def assert_same_snapshot(actual, expected):
+    pdt.assert_frame_equal(
+        actual.sort_values('product_id').reset_index(drop=True),
+        expected.sort_values('product_id').reset_index(drop=True),
+        check_dtype=False,
+    )
+
+
+def test_deltas_tombstones_and_readds_round_trip(tmp_path, periods):
+    store = SnapshotStore(str(tmp_path))
+    for frame in periods:
+        store.append(frame)
+
+    kinds = [entry['kind'] for entry in store.manifest['periods']]
+    assert kinds == ['base', 'delta', 'delta', 'delta']
+    for frame in periods:
+        assert_same_snapshot(store.snapshot(frame['date'].iloc[0]), frame)
+
+    reopened = SnapshotStore(str(tmp_path))
+    assert_same_snapshot(reopened.snapshot('2024-01-04'), periods[-1])
+
+
+def test_delta_stores_only_changed_rows(tmp_path, periods):
+    store = SnapshotStore(str(tmp_path))
+    store.append(periods[0])
+    assert store.append(periods[1]) == 2
+    assert store.append(periods[2]) == 1
+
+
+def test_history_follows_removal_and_readd(tmp_path, periods):
+    store = SnapshotStore(str(tmp_path))
+    store.ingest(pd.concat(periods, ignore_index=True))
+
+    history = store.history('PROD_0010')
+    assert list(history['date']) == ['2024-01-01', '2024-01-02', '2024-01-04']
+    assert list(history['stock_level']) == [110, 110, 42]
+    assert list(history['warehouse']) == ['WH_A', 'WH_A', 'WH_C']
+
+
+def test_ranges_clamp_to_stored_history(tmp_path, periods):
+    store = SnapshotStore(str(tmp_path))
+    store.ingest(pd.concat(periods, ignore_index=True))
+
+    assert len(store.history('PROD_0003', start='2023-01-01')) == 4
+    assert len(store.to_frame(start='2023-01-01', end='2024-01-02')) == 40
+    assert store.to_frame(end='2023-12-31').empty
+    with pytest.raises(KeyError):
+        store.snapshot('2023-12-31')
+
+
+def test_ingest_rewrites_restated_periods(tmp_path, periods):
+    store = SnapshotStore(str(tmp_path))
+    store.ingest(pd.concat(periods, ignore_index=True))
+
+    restated = [frame.copy() for frame in periods]
+    restated[1]['stock_level'] = 0
+    store.ingest(pd.concat(restated, ignore_index=True))
+
+    assert store.periods == ['2024-01-01', '2024-01-02', '2024-01-03', '2024-01-04']
+    assert_same_snapshot(store.snapshot('2024-01-01'), periods[0])
+    assert_same_snapshot(store.snapshot('2024-01-02'), restated[1])
+    assert_same_snapshot(SnapshotStore(str(tmp_path)).snapshot('2024-01-04'), restated[3])
+
+
+def test_ingest_keeps_unchanged_history(tmp_path, periods):
+    store = SnapshotStore(str(tmp_path))
+    store.ingest(pd.concat(periods[:3], ignore_index=True))
+    files = [entry['file'] for entry in store.manifest['periods']]
+
+    assert store.ingest(pd.concat(periods, ignore_index=True)) == 1
+    assert [entry['file'] for entry in store.manifest['periods']][:3] == files